@@ -1,312 +1,459 @@
-from locust import HttpUser, task, between, FastHttpUser
+# Patch first, so the websocket client's sockets are cooperative too.
+from gevent import monkey
+monkey.patch_all()
+
+from locust import task, between, FastHttpUser, LoadTestShape
 from locust import events
+from locust.runners import MasterRunner
+from gevent.lock import BoundedSemaphore
+from gevent.pool import Group
 import websocket
+import orjson
+import requests
+import logging
+import os
 import random
+import time
+from types import MappingProxyType
 from urllib.parse import urlparse
 
-class LoggedOutUser(FastHttpUser):
-	wait_time = between(1, 5)
-
-	def on_start(self):
-		self.client.post("/login", json={"username":"sam", "password":"password"})
-
-	@task
+# Stats labels used from more than one place
+NAME_CATEGORY = "/api/v3/forum/categories/:cat_id"
+NAME_CATEGORY_CREATE = "/api/v3/forum/categories/:cat_id/create"
+NAME_FORUM_CREATE = "/api/v3/forum/:forum_id/create"
+NAME_FORUM_FAVORITE = "/api/v3/forum/:forum_id/favorite"
+NAME_FORUM_SEARCH = "/forum/search"
+NAME_FEZ = "/api/v3/fez/:fez_id"
+NAME_EVENT_FAVORITE = "/api/v3/events/:event_id/favorite"
+NAME_BOARDGAME_FAVORITE = "/api/v3/boardgames/:game_id/favorite"
+
+# Forum category titles
+CATEGORY_EGYPE = "Egype"
+CATEGORY_GENERAL = "General"
+CATEGORY_EVENTS = "Event Forums"
+
+# Bodies are sent pre-encoded with orjson, so we set Content-Type ourselves.
+JSON_HEADERS = MappingProxyType({ "Content-Type": "application/json" })
+
+USERNAMES = ('sam', 'heidi', 'james')
+WEB_LOGINS = { username: orjson.dumps({ "username": username, "password": "password" }) for username in USERNAMES }
+
+def _seamailBody(title, info, *initialUsers):
+	return orjson.dumps({ "fezType": "closed", "title": title, "info": info, "minCapacity": 0, "maxCapacity": 0, 
+			"initialUsers": initialUsers })
+
+def _json(response):
+	return orjson.loads(response.content)
+
+# Logins, category IDs and ID pools are fetched once per worker and shared by all its users.
+_authCache = {}
+_authLocks = { username: BoundedSemaphore() for username in USERNAMES }
+
+def _login(client, username):
+	# Returns (auth headers, auth headers for JSON bodies, userID)
+	with _authLocks[username]:
+		if username not in _authCache:
+			authResponse = client.post("/api/v3/auth/login", auth=(username, 'password'), name="/api/v3/auth/login")
+			authData = _json(authResponse)
+			auth = { "Authorization": f"Bearer {authData['token']}" }
+			_authCache[username] = (MappingProxyType(auth), MappingProxyType({ **auth, **JSON_HEADERS }), authData["userID"])
+		return _authCache[username]
+
+_categoryIDs = {}
+_categoryLock = BoundedSemaphore()
+
+def _categoryID(client, headers, title):
+	with _categoryLock:
+		if not _categoryIDs:
+			catResponse = client.get("/api/v3/forum/categories", headers = headers)
+			_categoryIDs.update({ catData["title"]: catData["categoryID"] for catData in _json(catResponse) })
+		return _categoryIDs[title]
+
+# pool name -> (tuple of IDs, fetch time)
+_idPools = {}
+_idPoolLocks = {}
+
+def _isFresh(pool, maxAge):
+	return pool is not None and (maxAge is None or time.monotonic() - pool[1] <= maxAge)
+
+def _sharedIDs(name, fetch, maxAge = None):
+	pool = _idPools.get(name)
+	if not _isFresh(pool, maxAge):
+		with _idPoolLocks.setdefault(name, BoundedSemaphore()):
+			pool = _idPools.get(name)
+			if not _isFresh(pool, maxAge):
+				pool = _idPools[name] = (fetch(), time.monotonic())
+	return pool[0]
+
+def _eventIDs(client, headers):
+	def fetch():
+		eventResponse = client.get("/api/v3/events", headers = headers)
+		return tuple(event["eventID"] for event in _json(eventResponse))
+	return _sharedIDs("events", fetch)
+
+def _boardgameIDs(client, headers):
+	def fetch():
+		boardgameResponse = client.get("/api/v3/boardgames", headers = headers)
+		return tuple(game["gameID"] for game in _json(boardgameResponse)["gameArray"])
+	return _sharedIDs("boardgames", fetch)
+
+def _forumIDs(client, headers, categoryID, maxAge = None):
+	def fetch():
+		forumsResponse = client.get(f"/api/v3/forum/categories/{categoryID}", headers = headers, name=NAME_CATEGORY)
+		return tuple(thread["forumID"] for thread in _json(forumsResponse)["forumThreads"])
+	return _sharedIDs(f"forums/{categoryID}", fetch, maxAge)
+
+class _SeedClient:
+	# Stands in for self.client when filling the caches before any users exist
+	def __init__(self, host):
+		self.host = host.rstrip("/")
+		self.session = requests.Session()
+
+	def get(self, path, name = None, **kwargs):
+		return self.session.get(self.host + path, timeout=(SwiftarrUser.connection_timeout, SwiftarrUser.network_timeout), **kwargs)
+
+	def post(self, path, name = None, **kwargs):
+		return self.session.post(self.host + path, timeout=(SwiftarrUser.connection_timeout, SwiftarrUser.network_timeout), **kwargs)
+
+@events.test_start.add_listener
+def _primeCaches(environment, **kwargs):
+	# The server's database may have been reset since the last run
+	_authCache.clear()
+	_categoryIDs.clear()
+	_idPools.clear()
+	ForumAPIUser.postIDCache.clear()
+	if isinstance(environment.runner, MasterRunner) or not environment.host:
+		return
+	seed = _SeedClient(environment.host)
+	try:
+		logins = Group()
+		for username in USERNAMES:
+			logins.spawn(_login, seed, username)
+		logins.join(raise_error=True)
+		jamesAuth = _authCache['james'][0]
+		_forumIDs(seed, jamesAuth, _categoryID(seed, jamesAuth, CATEGORY_EVENTS))
+		_eventIDs(seed, jamesAuth)
+		_boardgameIDs(seed, jamesAuth)
+	except (requests.RequestException, ValueError, KeyError) as error:
+		# Not fatal; users fetch whatever's missing
+		logging.warning("Couldn't preload shared test data: %r", error)
+
+class _StageShape(LoadTestShape):
+	# Locust always runs a shape it finds, so these only exist when SWIFTARR_SHAPE names them
+	abstract = True
+	# (seconds into the run this stage ends, users, spawn rate)
+	stages = ()
+
+	def tick(self):
+		runTime = self.get_run_time()
+		for endTime, users, spawnRate in self.stages:
+			if runTime < endTime:
+				return (users, spawnRate)
+		return None
+
+class StagedShape(_StageShape):
+	abstract = os.environ.get("SWIFTARR_SHAPE") != "staged"
+	stages = (
+		(60, 500, 50),
+		(180, 1500, 100),
+		(600, 3000, 100),
+	)
+
+class GradualLoadShape(_StageShape):
+	abstract = os.environ.get("SWIFTARR_SHAPE") != "gradual"
+	stages = (
+		(60, 500, 10),
+		(180, 3000, 25),
+		(600, 3000, 25),
+	)
+
+class SwiftarrUser(FastHttpUser):
+	abstract = True
+	network_timeout = 30.0
+	connection_timeout = 10.0
+	# Same per-host connection limit as a browser
+	concurrency = 6
+	# SWIFTARR_WAIT="min,max" seconds, e.g. 0.05,0.2 for a stress run
+	wait_time = between(*map(float, os.environ.get("SWIFTARR_WAIT", "1,5").split(",")))
+
+	def __init__(self, environment):
+		super().__init__(environment)
+		# Round-robin index for pick(), starting somewhere different for each user
+		self.rr = random.randrange(1 << 16)
+
+	def loginAs(self, *usernames):
+		# Sets self.<username>Auth, self.<username>JSONAuth and self.<username>ID
+		for username in usernames:
+			auth, jsonAuth, userID = _login(self.client, username)
+			setattr(self, username + "Auth", auth)
+			setattr(self, username + "JSONAuth", jsonAuth)
+			setattr(self, username + "ID", userID)
+
+	def webLoginAs(self, username):
+		self.client.post("/login", data=WEB_LOGINS[username], headers = JSON_HEADERS)
+
+	def pick(self, pool):
+		self.rr += 1
+		return pool[self.rr % len(pool)]
+
+class LoggedOutUser(SwiftarrUser):
+	@task(1)
 	def rootPage(self):
 		self.client.get("/")
 
-	@task
+	@task(2)
 	def eventsPage(self):
 		self.client.get("/events")
 
-	@task
+	@task(2)
 	def boardgamePage(self):
 		self.client.get("/boardgames")
 
-	@task
-	def boardgamePage(self):
+	@task(2)
+	def karaokePage(self):
 		self.client.get("/karaoke")
 
-class ForumAPIUser(FastHttpUser):
-	wait_time = between(1, 5)
-	samAuth = { "Authorization": "Bearer " }
-	heidiAuth = { "Authorization": "Bearer " }
-	jamesAuth = { "Authorization": "Bearer " }
+class ForumAPIUser(SwiftarrUser):
+	firstPost = { "text": "hello this is my locust post", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False }
+	newForum = orjson.dumps({ "title": "A Locust Forum", "firstPost": firstPost })
+	newForumToRename = orjson.dumps({ "title": "A Locust Forum To Rename", "firstPost": firstPost })
+	replyPost = orjson.dumps({ "text": "This is a reply in the Locust forum", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False })
+	postToDelete = orjson.dumps({ "text": "This is a post we're going to delete.", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False })
+	updatedPost = orjson.dumps({ "text": "This is a post we've updated.", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False })
+	# Two independent chains of (URL suffix, stats label); each chain runs in order
+	postActionChains = tuple(tuple((action, f"/api/v3/forum/post/:post_id/{action}") for action in chain) 
+			for chain in (("like", "unreact"), ("bookmark", "bookmark/remove")))
+	# forumID -> (IDs of posts not by sam, parse time)
+	postIDCache = {}
+	postIDCacheSize = 16
+	postIDsRefreshInterval = 30
 	
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth=('sam', 'password'))
-		self.samAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		authResponse = self.client.post("/api/v3/auth/login", auth=('heidi', 'password'))
-		self.heidiAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
+		self.loginAs('sam', 'heidi', 'james')
+		self.egypeCat = _categoryID(self.client, self.samAuth, CATEGORY_EGYPE)
+		self.generalCat = _categoryID(self.client, self.samAuth, CATEGORY_GENERAL)
 
-	@task
+	@task(5)
 	def readForum(self):
-		catResponse = self.client.get("/api/v3/forum/categories", headers = self.samAuth)
-		egypeCat = next(catData["categoryID"] for catData in catResponse.json() if catData["title"] == "Egype")
-		forumsResponse = self.client.get("/api/v3/forum/categories/" + egypeCat, headers = self.samAuth, 
-				name="/api/v3/forum/categories/:cat_id")
-		firstForum = forumsResponse.json()["forumThreads"][0]["forumID"]
-		forumResponse = self.client.get("/api/v3/forum/" + firstForum, headers = self.samAuth, name="/api/v3/forum/:forum_id")
-		posts = [ post["postID"] for post in forumResponse.json()["posts"] if post["author"]["username"] != "sam" ]
-		randPost = str(random.choice(posts))
-		self.client.post("/api/v3/forum/post/" + randPost + "/like", headers = self.samAuth, name="/api/v3/forum/post/:post_id/like")
-		self.client.post("/api/v3/forum/post/" + randPost + "/unreact", headers = self.samAuth, name="/api/v3/forum/post/:post_id/unreact")
-		self.client.post("/api/v3/forum/post/" + randPost + "/bookmark", headers = self.samAuth, name="/api/v3/forum/post/:post_id/bookmark")
-		self.client.post("/api/v3/forum/post/" + randPost + "/bookmark/remove", headers = self.samAuth, name="/api/v3/forum/post/:post_id/bookmark/remove")
-
-	@task
+		forumsResponse = self.client.get(f"/api/v3/forum/categories/{self.egypeCat}", headers = self.samAuth, 
+				name=NAME_CATEGORY)
+		firstForum = _json(forumsResponse)["forumThreads"][0]["forumID"]
+		forumResponse = self.client.get(f"/api/v3/forum/{firstForum}", headers = self.samAuth, name="/api/v3/forum/:forum_id")
+		randPost = self.pick(self.postIDs(firstForum, forumResponse))
+		chains = Group()
+		for actions in self.postActionChains:
+			chains.spawn(self.postActions, randPost, actions)
+		chains.join()
+
+	def postIDs(self, forumID, forumResponse):
+		cached = self.postIDCache.get(forumID)
+		if not _isFresh(cached, self.postIDsRefreshInterval):
+			if forumID not in self.postIDCache and len(self.postIDCache) >= self.postIDCacheSize:
+				del self.postIDCache[next(iter(self.postIDCache))]
+			posts = tuple(post["postID"] for post in _json(forumResponse)["posts"] if post["author"]["username"] != "sam")
+			cached = self.postIDCache[forumID] = (posts, time.monotonic())
+		return cached[0]
+
+	def postActions(self, postID, actions):
+		for action, name in actions:
+			self.client.post(f"/api/v3/forum/post/{postID}/{action}", headers = self.samAuth, name=name)
+
+	@task(5)
 	def searchPosts(self):
 		self.client.get("/api/v3/forum/post/search?search=hello", headers = self.samAuth, name="/api/v3/forum/post/search")
 
-	@task
+	@task(5)
 	def ownForums(self):
 		self.client.get("/api/v3/forum/owner", headers = self.samAuth, name="/api/v3/forum/owner")
 
-	@task
+	@task(1)
 	def createForum(self):
-		# get categories, find "Lower Decks"
-		catResponse = self.client.get("/api/v3/forum/categories", headers = self.samAuth)
-		generalCat = next(catData["categoryID"] for catData in catResponse.json() if catData["title"] == "General")
-		# Create forum in "Lower Decks" category
-		createResponse = self.client.post("/api/v3/forum/categories/" + generalCat + "/create", 
-				json={ "title": "A Locust Forum", "firstPost":{"text": "hello this is my locust post", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False }},
-				headers = self.samAuth, name="/api/v3/forum/categories/:cat_id/create")
-		newForumID = createResponse.json()["forumID"]
-		# Add a post to the new forum
-		self.client.post("/api/v3/forum/" + newForumID + "/create", headers = self.samAuth, 
-				json={"text": "This is a reply in the Locust forum", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False }, name="/api/v3/forum/:forum_id/create")
+		# Create forum in "General" category
+		createResponse = self.client.post(f"/api/v3/forum/categories/{self.generalCat}/create", data=self.newForum,
+				headers = self.samJSONAuth, name=NAME_CATEGORY_CREATE)
+		newForumID = _json(createResponse)["forumID"]
+		# Add a post to the new forum, alongside the rest
+		reply = Group()
+		reply.spawn(self.client.post, f"/api/v3/forum/{newForumID}/create", headers = self.samJSONAuth, 
+				data=self.replyPost, name=NAME_FORUM_CREATE)
 		# Add another post
-		postResponse = self.client.post("/api/v3/forum/" + newForumID + "/create", headers = self.samAuth, 
-				json={"text": "This is a post we're going to delete.", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False }, name="/api/v3/forum/:forum_id/create")
-		postToDeleteID = str(postResponse.json()["postID"])
+		postResponse = self.client.post(f"/api/v3/forum/{newForumID}/create", headers = self.samJSONAuth, 
+				data=self.postToDelete, name=NAME_FORUM_CREATE)
+		postToDeleteID = _json(postResponse)["postID"]
 		# Get details on the post
-		self.client.get("/api/v3/forum/post/" + postToDeleteID, headers = self.samAuth, name="/api/v3/forum/post/:post_id")
+		self.client.get(f"/api/v3/forum/post/{postToDeleteID}", headers = self.samAuth, name="/api/v3/forum/post/:post_id")
 		# Delete the post
-		self.client.post("/api/v3/forum/post/" + postToDeleteID + "/delete", headers = self.samAuth, 
+		self.client.post(f"/api/v3/forum/post/{postToDeleteID}/delete", headers = self.samAuth, 
 				name="/api/v3/forum/post/:post_id/delete")
-# mods only		self.client.post("/api/v3/forum/" + newForumID + "/delete", headers = self.samAuth, name="/api/v3/forum/:forum_id/delete")
+		reply.join()
+# mods only		self.client.post(f"/api/v3/forum/{newForumID}/delete", headers = self.samAuth, name="/api/v3/forum/:forum_id/delete")
 		
-	@task
+	@task(1)
 	def createRenameForum(self):
-		catResponse = self.client.get("/api/v3/forum/categories", headers = self.samAuth)
-		generalCat = next(catData["categoryID"] for catData in catResponse.json() if catData["title"] == "General")
-		createResponse = self.client.post("/api/v3/forum/categories/" + generalCat + "/create", 
-				json={ "title": "A Locust Forum To Rename", "firstPost":{"text": "hello this is my locust post", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False }},
-				headers = self.samAuth, name="/api/v3/forum/categories/:cat_id/create")
-		newForumID = createResponse.json()["forumID"]
-		postResponse = self.client.post("/api/v3/forum/" + newForumID + "/create", headers = self.samAuth, 
-				json={"text": "This is a reply in the Locust forum", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False }, name="/api/v3/forum/:forum_id/create")
-		postID = str(postResponse.json()["postID"])
-		self.client.post("/api/v3/forum/post/" + postID + "/update", headers = self.samAuth, 
-				json={"text": "This is a post we've updated.", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False }, name="/api/v3/forum/post/:post_id/update")
-		self.client.post("/api/v3/forum/" + newForumID + "/rename/A%20Locust%20Forum%20We%20Renamed", 
+		createResponse = self.client.post(f"/api/v3/forum/categories/{self.generalCat}/create", data=self.newForumToRename,
+				headers = self.samJSONAuth, name=NAME_CATEGORY_CREATE)
+		newForumID = _json(createResponse)["forumID"]
+		postResponse = self.client.post(f"/api/v3/forum/{newForumID}/create", headers = self.samJSONAuth, 
+				data=self.replyPost, name=NAME_FORUM_CREATE)
+		postID = _json(postResponse)["postID"]
+		edits = Group()
+		edits.spawn(self.client.post, f"/api/v3/forum/post/{postID}/update", headers = self.samJSONAuth, 
+				data=self.updatedPost, name="/api/v3/forum/post/:post_id/update")
+		edits.spawn(self.client.post, f"/api/v3/forum/{newForumID}/rename/A%20Locust%20Forum%20We%20Renamed", 
 				headers = self.samAuth, name="/api/v3/forum/:forum_id/rename/:new_name")
+		edits.join()
 
-	@task
+	@task(2)
 	def favoriteForum(self):
-		catResponse = self.client.get("/api/v3/forum/categories", headers = self.samAuth)
-		generalCat = next(catData["categoryID"] for catData in catResponse.json() if catData["title"] == "General")
-		forumsResponse = self.client.get("/api/v3/forum/categories/" + generalCat, headers = self.samAuth, 
-				name="/api/v3/forum/categories/:cat_id")
-		if len(forumsResponse.json()["forumThreads"]) > 0:
-			firstForum = forumsResponse.json()["forumThreads"][0]["forumID"]
-			self.client.post("/api/v3/forum/" + firstForum + "/favorite",  headers = self.samAuth, name="/api/v3/forum/:forum_id/favorite")
-			self.client.delete("/api/v3/forum/" + firstForum + "/favorite",  headers = self.samAuth, name="/api/v3/forum/:forum_id/favorite")
-
-class ForumWebUser(FastHttpUser):
-	wait_time = between(1, 5)
-	jamesAuth = { "Authorization": "Bearer " }
+		forumsResponse = self.client.get(f"/api/v3/forum/categories/{self.generalCat}", headers = self.samAuth, 
+				name=NAME_CATEGORY)
+		forumThreads = _json(forumsResponse)["forumThreads"]
+		if len(forumThreads) > 0:
+			firstForum = forumThreads[0]["forumID"]
+			self.client.post(f"/api/v3/forum/{firstForum}/favorite",  headers = self.samAuth, name=NAME_FORUM_FAVORITE)
+			self.client.delete(f"/api/v3/forum/{firstForum}/favorite",  headers = self.samAuth, name=NAME_FORUM_FAVORITE)
+
+class ForumWebUser(SwiftarrUser):
 	eventsCategory = ""
-	forumIDs = ""
+	forumIDsRefreshInterval = 30
+	staticPages = ("/forums", "/forum/favorites", "/forum/owned", "/forumpost/mentions", "/forumpost/favorite", 
+			"/forumpost/owned")
 	
 	def on_start(self):
 		# log james in, both with the log in page POST and via the API (so we can get object IDs for further calls)
-		self.client.post("/login", json={"username":"james", "password":"password"})
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
+		self.webLoginAs('james')
+		self.loginAs('james')
 		# get some initial data - Events category, and some forum thread IDs 
-		catResponse = self.client.get("/api/v3/forum/categories", headers = self.jamesAuth)
-		self.eventsCategory = next(catData["categoryID"] for catData in catResponse.json() if catData["title"] == "Event Forums")
-		forumsResponse = self.client.get("/api/v3/forum/categories/" + self.eventsCategory, headers = self.jamesAuth,
-				name="/api/v3/forum/categories/:cat_id")
-		self.forumIDs = [ thread["forumID"] for thread in forumsResponse.json()["forumThreads"] ]
+		self.eventsCategory = _categoryID(self.client, self.jamesAuth, CATEGORY_EVENTS)
+		self.eventsCategoryURL = f"/forums/{self.eventsCategory}"
+		self.forumIDs()
 
-	@task
-	def viewCategories(self):
-		self.client.get("/forums")
+	def forumIDs(self):
+		return _forumIDs(self.client, self.jamesAuth, self.eventsCategory, self.forumIDsRefreshInterval)
+
+	@task(len(staticPages))
+	def viewStaticPage(self):
+		self.client.get(self.pick(self.staticPages))
 
 	@task
 	def viewEventsForums(self):
-		self.client.get("/forums/" + self.eventsCategory, name="/forums/:category_id")
+		self.client.get(self.eventsCategoryURL, name="/forums/:category_id")
 
 	@task
 	def viewEventsForumThread(self):
-		randomEvent = random.choice(self.forumIDs)
-		self.client.get("/forum/" + randomEvent, name="/forum/:forum_id")
+		randomEvent = self.pick(self.forumIDs())
+		self.client.get(f"/forum/{randomEvent}", name="/forum/:forum_id")
 
 	@task
 	def searchForums(self):
-		self.client.get("/forum/search?search=locust&searchType=forums", name="/forum/search")
+		self.client.get("/forum/search?search=locust&searchType=forums", name=NAME_FORUM_SEARCH)
 
 	@task
 	def searchForumPosts(self):
-		self.client.get("/forum/search?search=locust&searchType=posts", name="/forum/search")
-
-	@task
-	def showFavorites(self):
-		self.client.get("/forum/favorites")
-
-	@task
-	def showOwnForums(self):
-		self.client.get("/forum/owned")
-
-	@task
-	def showMentions(self):
-		self.client.get("/forumpost/mentions")
-
-	@task
-	def showFavoritePosts(self):
-		self.client.get("/forumpost/favorite")
-
-	@task
-	def showOwnPosts(self):
-		self.client.get("/forumpost/owned")
+		self.client.get("/forum/search?search=locust&searchType=posts", name=NAME_FORUM_SEARCH)
 
 	@task
 	def alsoSearchForumPosts(self):
 		# There's 2 different ways to get to search posts in the UI, with different <form>s.
 		self.client.get("/forumpost/search?search=hello", name="/forumpost/search")
 
-class SeamailAPIUser(FastHttpUser):
-	wait_time = between(1, 5)
-	samAuth = { "Authorization": "Bearer " }
-	samID = ""
-	heidiAuth = { "Authorization": "Bearer " }
-	heidiID = ""
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
+class SeamailAPIUser(SwiftarrUser):
 	fezID = ""
+	seamailPost = orjson.dumps({ "text": "This is a Locust Seamail Post.", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False })
 	
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth=('sam', 'password'))
-		self.samAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.samID = authResponse.json()["userID"]
-		authResponse = self.client.post("/api/v3/auth/login", auth=('heidi', 'password'))
-		self.heidiAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.heidiID = authResponse.json()["userID"]
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
-		createResponse = self.client.post("/api/v3/fez/create", headers = self.heidiAuth, 
-				json={ "fezType": "closed", "title": "Hey Everyone", "info": "what", "minCapacity": 0, "maxCapacity": 0, "initialUsers": [ self.samID, self.jamesID ] })
-		self.fezID = createResponse.json()["fezID"]
+		self.loginAs('sam', 'heidi', 'james')
+		self.newSeamail = _seamailBody("Hey Everyone", "what", self.samID, self.jamesID)
 
-	@task
+	@task(10)
 	def joinedSeamails(self):
 		self.client.get("/api/v3/fez/joined?type=private", headers = self.heidiAuth)
 
-	@task
+	@task(5)
 	def ownedSeamails(self):
 		self.client.get("/api/v3/fez/owner?type=private", headers = self.heidiAuth)
 
-	@task
+	@task(1)
 	def createSeamail(self):
-		createResponse = self.client.post("/api/v3/fez/create", headers = self.heidiAuth, 
-				json={ "fezType": "closed", "title": "Hey Everyone", "info": "what", "minCapacity": 0, "maxCapacity": 0, "initialUsers": [ self.samID, self.jamesID ] })
-		newFezID = createResponse.json()["fezID"]
-		self.client.get("/api/v3/fez/" + newFezID, headers = self.samAuth, name="/api/v3/fez/:fez_ID")
-		self.client.get("/api/v3/fez/" + newFezID, headers = self.jamesAuth, name="/api/v3/fez/:fez_ID")
-
-	@task
+		createResponse = self.client.post("/api/v3/fez/create", headers = self.heidiJSONAuth, data=self.newSeamail)
+		newFezID = _json(createResponse)["fezID"]
+		# Sam and James each open the new seamail
+		reads = Group()
+		reads.spawn(self.client.get, f"/api/v3/fez/{newFezID}", headers = self.samAuth, name=NAME_FEZ)
+		reads.spawn(self.client.get, f"/api/v3/fez/{newFezID}", headers = self.jamesAuth, name=NAME_FEZ)
+		reads.join()
+
+	@task(2)
 	def postAndDeleteMsg(self):
-		response = self.client.post("/api/v3/fez/" + self.fezID + "/post", json={ "text": "This is a Locust Seamail Post.", "images": [], "postAsModerator": False, "postAsTwitarrTeam": False },
-				headers = self.heidiAuth, name = "/api/v3/fez/:fez_id/post")
-		postID = str(response.json()["postID"])
-		self.client.delete("/api/v3/fez/post/" + postID, headers = self.heidiAuth, name = "/api/v3/fez/post/:postID")
-
-class SeamailWebUser(FastHttpUser):
-	wait_time = between(1, 5)
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
-	heidiAuth = { "Authorization": "Bearer " }
-	heidiID = ""
-	
+		# Created on first use rather than in on_start
+		if not self.fezID:
+			createResponse = self.client.post("/api/v3/fez/create", headers = self.heidiJSONAuth, data=self.newSeamail)
+			self.fezID = _json(createResponse)["fezID"]
+		response = self.client.post(f"/api/v3/fez/{self.fezID}/post", data=self.seamailPost,
+				headers = self.heidiJSONAuth, name = "/api/v3/fez/:fez_id/post")
+		postID = _json(response)["postID"]
+		self.client.delete(f"/api/v3/fez/post/{postID}", headers = self.heidiAuth, name = "/api/v3/fez/post/:post_id")
+
+class SeamailWebUser(SwiftarrUser):
 	def on_start(self):
 		# log james in, both with the log in page POST and via the API (so we can get object IDs for further calls)
-		self.client.post("/login", json={"username":"james", "password":"password"})
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
-		authResponse = self.client.post("/api/v3/auth/login", auth=('heidi', 'password'))
-		self.heidiAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.heidiID = authResponse.json()["userID"]
+		self.webLoginAs('james')
+		self.loginAs('james', 'heidi')
+		self.newWebSeamail = orjson.dumps({ "subject": "What about Locust?", "postText": "A post, full of text", "participants": self.heidiID })
+		self.newSeamail = _seamailBody("Talking to Sam", "", self.heidiID)
 
-	@task
+	@task(10)
 	def viewSeamailRoot(self):
 		self.client.get("/seamail")
 
-	@task
+	@task(3)
 	def viewSeamailCreate(self):
 		self.client.get("/seamail/create")
 
-	@task
+	@task(3)
 	def seamailUsernameSearch(self):
 		self.client.get("/seamail/usernames/search/adm", name="/seamail/usernames/search/:search_string")
 
-	@task
+	@task(1)
 	def seamailCreate(self):
-		self.client.post("/seamail/create", json={"subject": "What about Locust?", "postText": "A post, full of text", "participants": self.heidiID} )
+		self.client.post("/seamail/create", data=self.newWebSeamail, headers = JSON_HEADERS)
 
-	@task
+	@task(1)
 	def seamailCreateAndView(self):
-		createResponse = self.client.post("/api/v3/fez/create", headers = self.jamesAuth, 
-				json={ "fezType": "closed", "title": "Talking to Sam", "info": "", "minCapacity": 0, "maxCapacity": 0, "initialUsers": [ self.heidiID ] })
-		newFezID = createResponse.json()["fezID"]
-		self.client.get("/seamail/" + newFezID, name="/seamail/:seamail_id")
-
-class EventsAPIUser(FastHttpUser):
-	wait_time = between(1, 5)
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
-	heidiAuth = { "Authorization": "Bearer " }
-	heidiID = ""
-	
+		createResponse = self.client.post("/api/v3/fez/create", headers = self.jamesJSONAuth, data=self.newSeamail)
+		newFezID = _json(createResponse)["fezID"]
+		self.client.get(f"/seamail/{newFezID}", name="/seamail/:seamail_id")
+
+class EventsAPIUser(SwiftarrUser):
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
-		authResponse = self.client.post("/api/v3/auth/login", auth=('heidi', 'password'))
-		self.heidiAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.heidiID = authResponse.json()["userID"]
+		self.loginAs('james', 'heidi')
 
-	@task
-	def getEvents(self):
-		eventResponse = self.client.get("/api/v3/events", headers = self.heidiAuth)
-		eventIDs = [ event["eventID"] for event in eventResponse.json() ]
-		self.client.get("/api/v3/events/" + random.choice(eventIDs), headers = self.heidiAuth, name="/api/v3/events/:event_id")
-		favEvent = random.choice(eventIDs)
-		self.client.post("/api/v3/events/" + favEvent + "/favorite", headers = self.heidiAuth, name="/api/v3/events/:event_id/favorite")
-		self.client.delete("/api/v3/events/" + favEvent + "/favorite", headers = self.heidiAuth, name="/api/v3/events/:event_id/favorite")
+	@task(5)
+	def listEvents(self):
+		self.client.get("/api/v3/events", headers = self.heidiAuth)
 
-	@task
+	@task(2)
+	def getEvents(self):
+		eventIDs = _eventIDs(self.client, self.heidiAuth)
+		detailEvent, favEvent = self.pick(eventIDs), self.pick(eventIDs)
+		reads = Group()
+		reads.spawn(self.client.get, f"/api/v3/events/{detailEvent}", headers = self.heidiAuth, name="/api/v3/events/:event_id")
+		self.client.post(f"/api/v3/events/{favEvent}/favorite", headers = self.heidiAuth, name=NAME_EVENT_FAVORITE)
+		self.client.delete(f"/api/v3/events/{favEvent}/favorite", headers = self.heidiAuth, name=NAME_EVENT_FAVORITE)
+		reads.join()
+
+	@task(5)
 	def searchEvents(self):
-		eventResponse = self.client.get("/api/v3/events?search=cruise", headers = self.heidiAuth)
+		self.client.get("/api/v3/events?search=cruise", headers = self.heidiAuth)
 
-	@task
+	@task(5)
 	def getFavoriteEvents(self):
 		self.client.get("/api/v3/events/favorites", headers = self.heidiAuth)
 
-class EventsWebUser(FastHttpUser):
-	wait_time = between(1, 5)
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
-	
+class EventsWebUser(SwiftarrUser):
 	def on_start(self):
-		self.client.post("/login", json={"username":"heidi", "password":"password"})
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
+		self.webLoginAs('heidi')
+		self.loginAs('james')
 
 	@task
 	def viewEvents(self):
@@ -316,43 +463,38 @@ class EventsWebUser(FastHttpUser):
 	def searchEvents(self):
 		self.client.get("/events?search=cruise")
 
-class BoardgamesAPIUser(FastHttpUser):
-	wait_time = between(1, 5)
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
-	
+class BoardgamesAPIUser(SwiftarrUser):
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
+		self.loginAs('james')
 
-	@task
+	@task(5)
+	def listBoardgames(self):
+		self.client.get("/api/v3/boardgames", headers = self.jamesAuth)
+
+	@task(2)
 	def getBoardgames(self):
-		boardgameResponse = self.client.get("/api/v3/boardgames", headers = self.jamesAuth)
-		boardgameIDs = [ game["gameID"] for game in boardgameResponse.json()["gameArray"] ]
-		self.client.get("/api/v3/boardgames/" + random.choice(boardgameIDs), headers = self.jamesAuth, name="/api/v3/boardgames/:game_id")
-		self.client.get("/api/v3/boardgames/expansions/" + random.choice(boardgameIDs), 
+		gameIDs = _boardgameIDs(self.client, self.jamesAuth)
+		detailGame, expansionsGame, favGame = self.pick(gameIDs), self.pick(gameIDs), self.pick(gameIDs)
+		reads = Group()
+		reads.spawn(self.client.get, f"/api/v3/boardgames/{detailGame}", headers = self.jamesAuth, name="/api/v3/boardgames/:game_id")
+		reads.spawn(self.client.get, f"/api/v3/boardgames/expansions/{expansionsGame}", 
 				headers = self.jamesAuth, name="/api/v3/boardgames/expansions/:game_id")
-		favGame = random.choice(boardgameIDs)
-		self.client.post("/api/v3/boardgames/" + favGame + "/favorite", headers = self.jamesAuth, name="/api/v3/boardgames/:game_id/favorite")
-		self.client.delete("/api/v3/boardgames/" + favGame + "/favorite", headers = self.jamesAuth, name="/api/v3/boardgames/:game_id/favorite")
+		self.client.post(f"/api/v3/boardgames/{favGame}/favorite", headers = self.jamesAuth, name=NAME_BOARDGAME_FAVORITE)
+		self.client.delete(f"/api/v3/boardgames/{favGame}/favorite", headers = self.jamesAuth, name=NAME_BOARDGAME_FAVORITE)
+		reads.join()
 
-	@task
+	@task(5)
 	def searchBoardgames(self):
-		eventResponse = self.client.get("/api/v3/boardgames?search=catan", headers = self.jamesAuth)
+		self.client.get("/api/v3/boardgames?search=catan", headers = self.jamesAuth)
 
-	@task
+	@task(5)
 	def getFavoriteBoardgames(self):
 		self.client.get("/api/v3/boardgames?favorite=true", headers = self.jamesAuth)
 
-class BoardgamesWebUser(FastHttpUser):
-	wait_time = between(1, 5)
-	heidiAuth = { "Authorization": "Bearer " }
-	
+class BoardgamesWebUser(SwiftarrUser):
 	def on_start(self):
-		self.client.post("/login", json={"username":"heidi", "password":"password"})
-		authResponse = self.client.post("/api/v3/auth/login", auth=('heidi', 'password'))
-		self.heidiAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
+		self.webLoginAs('heidi')
+		self.loginAs('heidi')
 
 	@task
 	def viewBoardgames(self):
@@ -364,18 +506,12 @@ class BoardgamesWebUser(FastHttpUser):
 
 	@task
 	def viewMakeGameFezPage(self):
-		boardgameResponse = self.client.get("/api/v3/boardgames", headers = self.heidiAuth)
-		boardgameIDs = [ game["gameID"] for game in boardgameResponse.json()["gameArray"] ]
-		fezGame = random.choice(boardgameIDs)
-		self.client.get("/boardgames/" + fezGame + "/createfez", name="/boardgames/:game_id/createFez")
+		fezGame = self.pick(_boardgameIDs(self.client, self.heidiAuth))
+		self.client.get(f"/boardgames/{fezGame}/createfez", name="/boardgames/:game_id/createfez")
 		
-class KaraokeAPIUser(FastHttpUser):
-	wait_time = between(1, 5)
-	heidiAuth = { "Authorization": "Bearer " }
-	
+class KaraokeAPIUser(SwiftarrUser):
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth=('heidi', 'password'))
-		self.heidiAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
+		self.loginAs('heidi')
 
 	@task
 	def getSongs(self):
@@ -389,9 +525,7 @@ class KaraokeAPIUser(FastHttpUser):
 	def getFavoriteSongs(self):
 		self.client.get("/api/v3/karaoke?favorite=true", headers = self.heidiAuth)
 
-class KaraokeWebUser(FastHttpUser):
-	wait_time = between(1, 5)
-	
+class KaraokeWebUser(SwiftarrUser):
 	@task
 	def viewSongsRootPage(self):
 		self.client.get("/karaoke")
@@ -400,15 +534,9 @@ class KaraokeWebUser(FastHttpUser):
 	def viewSongSearch(self):
 		self.client.get("/karaoke?search=prince")
 
-class AlertAPIUser(FastHttpUser):
-	wait_time = between(1, 5)
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
-	
+class AlertAPIUser(SwiftarrUser):
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth = ('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
+		self.loginAs('james')
 
 	@task
 	def getNotifications(self):
@@ -422,15 +550,10 @@ class AlertAPIUser(FastHttpUser):
 	def getDailyThemes(self):
 		self.client.get("/api/v3/notification/dailythemes", headers = self.jamesAuth)
 
-class ProfileAPIUser(FastHttpUser):
-	wait_time = between(1, 5)
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
-	
+class ProfileAPIUser(SwiftarrUser):
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth = ('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
+		self.loginAs('james')
+		self.jamesHeaderURL = f"/api/v3/users/{self.jamesID}"
 
 	@task
 	def getProfile(self):
@@ -442,11 +565,11 @@ class ProfileAPIUser(FastHttpUser):
 		
 	@task
 	def findUser(self):
-		self.client.get("/api/v3/users/find/heidi", headers = self.jamesAuth, name="/api/v3/users/:username")
+		self.client.get("/api/v3/users/find/heidi", headers = self.jamesAuth, name="/api/v3/users/find/:username")
 
 	@task
 	def getHeader(self):
-		self.client.get("/api/v3/users/" + self.jamesID, headers = self.jamesAuth, name="/api/v3/users/:user_ID")
+		self.client.get(self.jamesHeaderURL, headers = self.jamesAuth, name="/api/v3/users/:user_id")
 
 	@task
 	def userSearch(self):
@@ -458,39 +581,37 @@ class ProfileAPIUser(FastHttpUser):
 # ImageUser; uploads/downloads images
 # UserUser; modifies profile, sets alertwords/blocks/mutes/mutewords
 
-class SeamailWebsocketUser(FastHttpUser):
-	wait_time = between(1, 5)
-	samAuth = { "Authorization": "Bearer " }
-	samID = ""
-	heidiAuth = { "Authorization": "Bearer " }
-	heidiID = ""
-	jamesAuth = { "Authorization": "Bearer " }
-	jamesID = ""
+class SeamailWebsocketUser(SwiftarrUser):
 	fezID = ""
-	cookie = ""
+	ws_url = ""
+	ws = None
 	
 	def on_start(self):
-		authResponse = self.client.post("/api/v3/auth/login", auth=('sam', 'password'))
-		self.samAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.samID = authResponse.json()["userID"]
-		authResponse = self.client.post("/api/v3/auth/login", auth=('heidi', 'password'))
-		self.heidiAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.heidiID = authResponse.json()["userID"]
-		authResponse = self.client.post("/api/v3/auth/login", auth=('james', 'password'))
-		self.jamesAuth = { "Authorization": "Bearer " + authResponse.json()["token"] }
-		self.jamesID = authResponse.json()["userID"]
-		createResponse = self.client.post("/api/v3/fez/create", headers = self.heidiAuth, 
-				json={ "fezType": "closed", "title": "Hey Everyone", "info": "what", "minCapacity": 0, "maxCapacity": 0, "initialUsers": [ self.samID, self.jamesID ] })
-		self.fezID = createResponse.json()["fezID"]
-
-		# We need a cookie for the websocket module to talk.
-		cookieAuthResponse = self.client.post("/login", json={"username":"heidi", "password":"password"})
-		self.cookie = cookieAuthResponse.headers.get('set-cookie')
+		self.loginAs('sam', 'heidi', 'james')
+		createResponse = self.client.post("/api/v3/fez/create", headers = self.heidiJSONAuth, 
+				data=_seamailBody("Hey Everyone", "what", self.samID, self.jamesID))
+		self.fezID = _json(createResponse)["fezID"]
+		self.ws_url = f"ws://{urlparse(self.client.base_url).netloc}/api/v3/fez/{self.fezID}/socket"
+		self.wsHeaders = [ f"Authorization: {self.heidiAuth['Authorization']}" ]
+
+	def on_stop(self):
+		if self.ws:
+			self.ws.close()
+
+	def connect_fez_websocket(self):
+		self.ws = websocket.create_connection(self.ws_url, header=self.wsHeaders, enable_multithread=False)
 
 	@task
 	def open_fez_websocket(self):
-		ws_host = urlparse(self.client.base_url).netloc
-
-		ws = websocket.create_connection("ws://%s/fez/%s/socket" % (ws_host, self.fezID), cookie=self.cookie)
-		ws.send("test")
-		ws.close()
+		# One socket per user, reconnecting only after a failure
+		startTime = time.perf_counter()
+		exception = None
+		try:
+			if self.ws is None:
+				self.connect_fez_websocket()
+			self.ws.send("test")
+		except (websocket.WebSocketException, OSError) as error:
+			exception = error
+			self.ws = None
+		self.environment.events.request.fire(request_type="WS", name="/api/v3/fez/:fez_id/socket", 
+				response_time=(time.perf_counter() - startTime) * 1000, response_length=len("test"), exception=exception, context={})